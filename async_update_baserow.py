@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import os
+import urllib.parse
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+import aiohttp
+import orjson
+from baserowapi import Filter, GenericField, Table
+from update_baserow import BaserowTableBase, LOOKUP_PAGE_SIZE, RESEND_STATUS_CODES, RETRYABLE_STATUS_CODES, lookup_chunks, lookup_key
+
+logger = logging.getLogger(__name__)
+
+def _json_default(value: Any) -> Any:
+    # orjson handles datetimes natively but not Decimal
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class AsyncBaserowUpdater(BaserowTableBase):
+    # the schema is still loaded synchronously on construction, only row traffic is async
+    def __init__(self, baserow_url: str, baserow_api_key: str, table: Union[int, Table], schema: Dict[str, Any] = None, retry_max_count: int = 3, retry_wait_seconds: int = 10, batch_size: int = 100, schema_ttl_seconds: int = 300, concurrency: int = 4, connection_limit: int = 32, keepalive_timeout: int = 60):
+        super().__init__(baserow_url, baserow_api_key, table, schema, retry_max_count, retry_wait_seconds, schema_ttl_seconds)
+        self.batch_size = batch_size
+        self.headers = {
+            "Authorization": f"Token {baserow_api_key}",
+            "Content-Type": "application/json",
+        }
+        self.concurrency = concurrency
+        self.connection_limit = connection_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.aiohttp_session: Optional[aiohttp.ClientSession] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncBaserowUpdater":
+        self.__get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        # one session per instance so connections and TLS handshakes are reused
+        if self.aiohttp_session is None or self.aiohttp_session.closed:
+            connector = aiohttp.TCPConnector(limit=self.connection_limit, keepalive_timeout=self.keepalive_timeout)
+            self.aiohttp_session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self.aiohttp_session
+
+    async def close(self) -> None:
+        if self.aiohttp_session is not None and not self.aiohttp_session.closed:
+            await self.aiohttp_session.close()
+        self.aiohttp_session = None
+
+    async def __request(self, method: str, url: str, params: Dict[str, str] = None, payload: Dict[str, Any] = None) -> Any:
+        session = self.__get_session()
+        if not url.startswith("http"):
+            url = self.baserow_url + url
+
+        # orjson encodes and decodes the batch payloads several times faster than the stdlib json aiohttp uses
+        data = None if payload is None else orjson.dumps(payload, default=_json_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z)
+
+        for attempt in range(self.retry_max_count + 1):
+            try:
+                async with self.semaphore:
+                    async with session.request(method, url, params=params, data=data, headers={"Content-Type": "application/json"}) as response:
+                        response.raise_for_status()
+                        return orjson.loads(await response.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientResponseError):
+                    # a POST may have been applied before a 502/503/504, so only resend it when rate limited
+                    retryable_status_codes = RESEND_STATUS_CODES if method == "POST" else RETRYABLE_STATUS_CODES
+                    if e.status not in retryable_status_codes:
+                        raise e
+                elif method == "POST":
+                    # after a timeout or dropped connection there is no telling whether the rows were added
+                    raise e
+                if attempt == self.retry_max_count:
+                    raise e
+                logger.warning("%s %s - HTTPError %s", method, url, e)
+                await asyncio.sleep((attempt + 1) * self.retry_wait_seconds)
+
+    async def iter_rows(self, filters: List[Filter], filter_type='AND', include: List[str] = None, page_size: int = LOOKUP_PAGE_SIZE) -> AsyncIterator[Dict[str, Any]]:
+        filter_tree = {
+            "filter_type": filter_type,
+            "filters": [{"field": x.field_name, "type": x.operator, "value": x.value} for x in filters],
+            "groups": [],
+        }
+        params = {"user_field_names": "true", "filters": orjson.dumps(filter_tree).decode(), "size": str(page_size)}
+        if include is not None:
+            params["include"] = ",".join(include)
+
+        url = f"/api/database/rows/table/{self.table_id}/"
+        while url:
+            response = await self.__request("GET", url, params=params)
+            for row in response["results"]:
+                yield row
+            # the next url already carries the query string, but behind a TLS terminating proxy Baserow
+            # reports it as http://, so take the scheme from the configured url as baserowapi does
+            url = response.get("next")
+            if url:
+                url = urllib.parse.urlparse(url)._replace(scheme=urllib.parse.urlparse(self.baserow_url).scheme).geturl()
+            params = None
+
+    async def find_rows(self, filters: List[Filter], filter_type='AND', include: List[str] = None, size: int = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        matching_rows = list()
+        rows = self.iter_rows(filters, filter_type, include, page_size=size or LOOKUP_PAGE_SIZE)
+        try:
+            async for row in rows:
+                matching_rows.append(row)
+                if limit is not None and len(matching_rows) >= limit:
+                    break
+        finally:
+            await rows.aclose()
+
+        return matching_rows
+
+    async def __find_row_ids(self, keys: List[tuple], primary_cols: List[GenericField]) -> Dict[tuple, int]:
+        if len(primary_cols) == 1:
+            col_name = primary_cols[0].name
+            lookups = [
+                self.find_rows([Filter(col_name, str(key[0])) for key in chunk], filter_type='OR', include=[col_name], size=LOOKUP_PAGE_SIZE)
+                for chunk in lookup_chunks(col_name, keys)
+            ]
+        else:
+            # composite primary keys can't be expressed as a flat OR filter
+            lookups = [
+                self.find_rows([Filter(col.name, str(value)) for col, value in zip(primary_cols, key)], size=2, limit=2)
+                for key in keys
+            ]
+
+        row_ids: Dict[tuple, int] = dict()
+        for matching_rows in await asyncio.gather(*lookups):
+            for row in matching_rows:
+                key = lookup_key(primary_cols, [row[x.name] for x in primary_cols])
+                if key in row_ids:
+                    raise ValueError(f"Multiple rows found: {key}")
+                row_ids[key] = row["id"]
+        return row_ids
+
+    async def __upsert_rows_to_table(self, rows: List[Dict[str, Any]], add: bool) -> List[int]:
+        url = f"/api/database/rows/table/{self.table_id}/batch/"
+        params = {"user_field_names": "true"}
+        method = "POST" if add else "PATCH"
+
+        responses = await asyncio.gather(*[
+            self.__request(method, url, params=params, payload={"items": rows[i:i + self.batch_size]})
+            for i in range(0, len(rows), self.batch_size)
+        ])
+        return [item["id"] for response in responses for item in response["items"]]
+
+    async def update_rows(self, records: List[Dict[str, Any]], schema: Dict[Dict, GenericField] = None) -> List[int]:
+        table_schema = self._resolve_schema(schema)
+        primary_cols = self._primary_cols(table_schema)
+
+        prepared = self._prepare_rows(records, table_schema)
+        keys = [lookup_key(primary_cols, [data[x.name] for x in primary_cols]) for data in prepared]
+
+        unique_keys = list(dict.fromkeys(keys))
+        if len(unique_keys) != len(keys):
+            raise ValueError("Duplicate primary values in records")
+
+        row_ids = await self.__find_row_ids(unique_keys, primary_cols)
+
+        to_add: List[Dict[str, Any]] = list()
+        to_add_keys: List[tuple] = list()
+        to_update: List[Dict[str, Any]] = list()
+        for key, update_data in zip(keys, prepared):
+            if key in row_ids:
+                update_data["id"] = row_ids[key]
+                to_update.append(update_data)
+            else:
+                to_add.append(update_data)
+                to_add_keys.append(key)
+
+        upserts = list()
+        if to_add:
+            upserts.append(self.__upsert_rows_to_table(to_add, add=True))
+        if to_update:
+            upserts.append(self.__upsert_rows_to_table(to_update, add=False))
+        results = await asyncio.gather(*upserts)
+
+        if to_add:
+            for key, row_id in zip(to_add_keys, results[0]):
+                row_ids[key] = row_id
+
+        return [row_ids[key] for key in keys]
+
+    async def update_row(self, data: Dict[str, Any], schema: Dict[Dict, GenericField] = None) -> int:
+        row_ids = await self.update_rows([data], schema)
+        return row_ids[0]
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from datetime import datetime
+    load_dotenv()
+
+    table_id = 842
+
+    async def main():
+        async with AsyncBaserowUpdater(os.getenv('BASEROW_URL'), os.getenv('BASEROW_API_KEY'), table_id) as table_updater:
+            row_ids = await table_updater.update_rows([
+                {'Name': f'Hello world {i}', 'Number': i, 'Date european': datetime(2024, 1, 1, 0, 0, 0, 0)}
+                for i in range(10)
+            ])
+            print(row_ids)
+
+    asyncio.run(main())
+
+    print("Done")
@@ -0,0 +1,80 @@
+import json
+import urllib.parse
+import requests
+from baserowapi import Baserow, Table, TextField, NumberField, DateField, SingleSelectField, MultipleSelectField
+from baserowapi.models.fields import FieldList
+from update_baserow import BaserowUpdater
+
+BASEROW_URL = "http://baserow.test"
+
+def text_field(name, primary=False):
+    return TextField(name, {"id": 0, "name": name, "type": "text", "primary": primary, "read_only": False, "order": 0})
+
+def number_field(name, primary=False):
+    return NumberField(name, {"id": 0, "name": name, "type": "number", "primary": primary, "read_only": False, "order": 0, "number_decimal_places": 0, "number_negative": True})
+
+def date_field(name, date_format, include_time=False):
+    return DateField(name, {"id": 0, "name": name, "type": "date", "primary": False, "read_only": False, "order": 0, "date_format": date_format, "date_include_time": include_time, "date_time_format": "24"})
+
+def select_field(name, options, multiple=False):
+    field_class, field_type = (MultipleSelectField, "multiple_select") if multiple else (SingleSelectField, "single_select")
+    select_options = [{"id": i, "value": x, "color": "blue"} for i, x in enumerate(options)]
+    return field_class(name, {"id": 0, "name": name, "type": field_type, "primary": False, "read_only": False, "order": 0, "select_options": select_options})
+
+def http_error(status_code, body=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body or {}).encode()
+    return requests.HTTPError(f"{status_code} Client Error", response=response)
+
+def match_rows(rows, filter_tree):
+    # the subset of Baserow's filtering the updaters use, equal filters joined with AND / OR
+    matches = [(x["field"], x["value"]) for x in filter_tree["filters"]]
+    match = any if filter_tree["filter_type"] == "OR" else all
+    return [row for row in rows if match(str(row.get(name)) == value for name, value in matches)]
+
+class FakeClient(Baserow):
+    # stands in for the Baserow API, rows live in memory and every request is recorded
+    def __init__(self, rows=None):
+        super().__init__(url=BASEROW_URL, token="token")
+        self.rows = {x["id"]: dict(x) for x in rows or []}
+        self.next_id = max(self.rows, default=0) + 1
+        self.requests = list()
+        # (method, error) raised instead of handling the next matching request
+        self.failures = list()
+
+    def make_api_request(self, endpoint, method="GET", data=None, **kwargs):
+        self.requests.append((method, endpoint, data))
+        for i, (fail_method, error) in enumerate(self.failures):
+            if fail_method == method:
+                del self.failures[i]
+                raise error
+
+        if method == "GET":
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(endpoint).query)
+            results = match_rows(self.rows.values(), json.loads(query["filters"][0]))
+            return {"count": len(results), "next": None, "results": results}
+
+        items = list()
+        for item in data["items"]:
+            if method == "POST":
+                item = dict(item, id=self.next_id)
+                self.next_id += 1
+            elif item["id"] not in self.rows:
+                raise http_error(404, {"error": "ERROR_ROW_DOES_NOT_EXIST"})
+            self.rows.setdefault(item["id"], dict()).update(item)
+            items.append(dict(self.rows[item["id"]]))
+        return {"items": items}
+
+    def calls(self, method):
+        return [x for x in self.requests if x[0] == method]
+
+def make_table(client, fields, table_id=1):
+    table = Table(table_id, client)
+    table._fields = FieldList(list(fields.values()))
+    return table
+
+def make_updater(fields, rows=None, **kwargs):
+    client = FakeClient(rows)
+    updater = BaserowUpdater(BASEROW_URL, "token", make_table(client, fields), schema=fields, retry_wait_seconds=0, **kwargs)
+    return updater, client
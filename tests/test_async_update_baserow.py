@@ -0,0 +1,171 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+import aiohttp
+import pytest
+from aiohttp import web
+from baserowapi import Filter
+from async_update_baserow import AsyncBaserowUpdater
+from fakes import match_rows, number_field, text_field
+
+class FakeServer:
+    # a local Baserow rows API, rows live in memory and every request is recorded
+    def __init__(self, rows=None):
+        self.rows = {x["id"]: dict(x) for x in rows or []}
+        self.next_id = max(self.rows, default=0) + 1
+        self.requests = list()
+        self.url = None
+        # (method, status) answered instead of the next matching request, status None drops the connection after handling it
+        self.failures = list()
+        # scheme reported in next links, as a proxy in front of Baserow may leave it
+        self.next_scheme = "http"
+
+    def failure(self, request):
+        for i, (method, status) in enumerate(self.failures):
+            if method == request.method:
+                del self.failures[i]
+                return status, True
+        return None, False
+
+    async def list_rows(self, request):
+        self.requests.append(("GET", dict(request.query)))
+        results = match_rows(self.rows.values(), json.loads(request.query["filters"]))
+        size, page = int(request.query.get("size", 100)), int(request.query.get("page", 1))
+        next_url = None
+        if page * size < len(results):
+            next_url = str(request.url.update_query(page=str(page + 1)).with_scheme(self.next_scheme))
+        return web.json_response({"count": len(results), "next": next_url, "results": results[(page - 1) * size:page * size]})
+
+    async def add_rows(self, request):
+        payload = await request.json()
+        self.requests.append(("POST", payload))
+        status, failing = self.failure(request)
+        if status is not None:
+            return web.json_response({"error": "ERROR_REQUEST_THROTTLED"}, status=status)
+        items = list()
+        for item in payload["items"]:
+            item = dict(item, id=self.next_id)
+            self.next_id += 1
+            self.rows[item["id"]] = item
+            items.append(item)
+        if failing:
+            # the rows are saved but the response never arrives
+            request.transport.close()
+        return web.json_response({"items": items})
+
+    async def update_rows(self, request):
+        payload = await request.json()
+        self.requests.append(("PATCH", payload))
+        for item in payload["items"]:
+            if item["id"] not in self.rows:
+                return web.json_response({"error": "ERROR_ROW_DOES_NOT_EXIST"}, status=404)
+            self.rows[item["id"]].update(item)
+        return web.json_response({"items": [self.rows[x["id"]] for x in payload["items"]]})
+
+    def calls(self, method):
+        return [x for x in self.requests if x[0] == method]
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/api/database/rows/table/{table_id}/", self.list_rows)
+        app.router.add_post("/api/database/rows/table/{table_id}/batch/", self.add_rows)
+        app.router.add_patch("/api/database/rows/table/{table_id}/batch/", self.update_rows)
+        return app
+
+@asynccontextmanager
+async def serve(server, fields, **kwargs):
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    server.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    try:
+        async with AsyncBaserowUpdater(server.url, "token", 1, schema=fields, retry_wait_seconds=0, **kwargs) as updater:
+            yield updater
+    finally:
+        await runner.cleanup()
+
+def test_update_rows_adds_and_updates():
+    fields = {"Name": text_field("Name", primary=True), "Number": number_field("Number")}
+    server = FakeServer(rows=[{"id": 1, "Name": "a", "Number": "1"}])
+
+    async def run():
+        async with serve(server, fields, batch_size=2) as updater:
+            return await updater.update_rows([{"Name": "a", "Number": 2}] + [{"Name": str(i), "Number": i} for i in range(3)])
+
+    assert asyncio.run(run()) == [1, 2, 3, 4]
+    assert server.rows[1]["Number"] == 2
+    # the three new rows go out as two batches
+    assert len(server.calls("POST")) == 2
+    assert len(server.calls("PATCH")) == 1
+
+def test_update_rows_composite_primary():
+    fields = {"A": text_field("A", primary=True), "B": number_field("B", primary=True), "Name": text_field("Name")}
+    server = FakeServer(rows=[{"id": 3, "A": "x", "B": "1", "Name": "old"}])
+
+    async def run():
+        async with serve(server, fields) as updater:
+            return await updater.update_rows([{"A": "x", "B": 1, "Name": "new"}, {"A": "x", "B": 2, "Name": "added"}])
+
+    assert asyncio.run(run()) == [3, 4]
+    assert server.rows[3]["Name"] == "new"
+
+def test_update_row():
+    server = FakeServer()
+
+    async def run():
+        async with serve(server, {"Name": text_field("Name", primary=True)}) as updater:
+            row_id = await updater.update_row({"Name": "a"})
+            return row_id, await updater.update_row({"Name": "a"})
+
+    assert asyncio.run(run()) == (1, 1)
+    assert len(server.rows) == 1
+
+def test_find_rows_follows_pages():
+    server = FakeServer(rows=[{"id": i, "Name": "a"} for i in range(1, 6)])
+
+    async def run():
+        async with serve(server, {"Name": text_field("Name", primary=True)}) as updater:
+            rows = await updater.find_rows([Filter("Name", "a")], size=2)
+            limited = await updater.find_rows([Filter("Name", "a")], size=2, limit=3)
+            return rows, limited
+
+    rows, limited = asyncio.run(run())
+    assert [x["id"] for x in rows] == [1, 2, 3, 4, 5]
+    assert [x["id"] for x in limited] == [1, 2, 3]
+    # three pages for everything, then stopping after the second page once the limit is reached
+    assert len(server.calls("GET")) == 5
+
+def test_post_is_not_resent_after_a_dropped_connection():
+    server = FakeServer()
+    server.failures.append(("POST", None))
+
+    async def run():
+        async with serve(server, {"Name": text_field("Name", primary=True)}) as updater:
+            await updater.update_rows([{"Name": "a"}])
+
+    with pytest.raises(aiohttp.ClientError):
+        asyncio.run(run())
+    assert len(server.calls("POST")) == 1
+    assert len(server.rows) == 1
+
+def test_rate_limited_post_is_resent():
+    server = FakeServer()
+    server.failures.append(("POST", 429))
+
+    async def run():
+        async with serve(server, {"Name": text_field("Name", primary=True)}) as updater:
+            return await updater.update_rows([{"Name": "a"}])
+
+    assert asyncio.run(run()) == [1]
+    assert len(server.calls("POST")) == 2
+
+def test_find_rows_keeps_the_configured_scheme_for_next_pages():
+    server = FakeServer(rows=[{"id": i, "Name": "a"} for i in range(1, 4)])
+    server.next_scheme = "https"
+
+    async def run():
+        async with serve(server, {"Name": text_field("Name", primary=True)}) as updater:
+            return await updater.find_rows([Filter("Name", "a")], size=2)
+
+    assert [x["id"] for x in asyncio.run(run())] == [1, 2, 3]
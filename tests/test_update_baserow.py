@@ -0,0 +1,263 @@
+import json
+import threading
+import urllib.parse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import update_baserow
+from baserowapi import Filter
+from update_baserow import BaserowUpdater, TableSchema, LOOKUP_FILTER_MAX_LENGTH, LOOKUP_PAGE_SIZE, lookup_chunks, lookup_key
+from fakes import FakeClient, date_field, http_error, make_table, make_updater, number_field, select_field, text_field
+
+@pytest.fixture
+def schema():
+    fields = [
+        text_field("Name", primary=True),
+        number_field("Number"),
+        date_field("Date ISO", "ISO"),
+        date_field("Date US", "US", include_time=True),
+        date_field("Date EU", "EU"),
+        select_field("Single", ["A", "B"]),
+        select_field("Multiple", ["X", "Y", "Z"], multiple=True),
+    ]
+    return TableSchema.from_fields({x.name: x for x in fields})
+
+def normalize(table_schema, data):
+    return table_schema.row_plan(frozenset(data)).normalize(data)
+
+def test_update_rows_adds_and_updates():
+    fields = {"Name": text_field("Name", primary=True), "Number": number_field("Number")}
+    updater, client = make_updater(fields, rows=[{"id": 1, "Name": "a", "Number": "1"}])
+
+    assert updater.update_rows([{"Name": "a", "Number": 2}, {"Name": "b", "Number": 3}]) == [1, 2]
+    assert client.rows[1]["Number"] == 2
+    assert client.rows[2]["Name"] == "b"
+    assert [x[0] for x in client.requests] == ["GET", "POST", "PATCH"]
+
+def test_update_rows_duplicate_keys():
+    updater, _ = make_updater({"Name": text_field("Name", primary=True)})
+    with pytest.raises(ValueError, match="Duplicate primary values"):
+        updater.update_rows([{"Name": "a"}, {"Name": "a"}])
+
+def test_is_schema_drift():
+    assert update_baserow._is_schema_drift(http_error(400, {"error": "ERROR_FIELD_DOES_NOT_EXIST"}))
+    assert not update_baserow._is_schema_drift(http_error(400, {"error": "ERROR_USER_NOT_IN_GROUP"}))
+    assert not update_baserow._is_schema_drift(http_error(404, {"error": "ERROR_FIELD_DOES_NOT_EXIST"}))
+    # baserowapi's own writable field check never reached the server
+    assert not update_baserow._is_schema_drift(Exception("Field 'Nope' is not writable or does not exist in the table."))
+
+def test_schema_drift_invalidates_schema():
+    updater, client = make_updater({"Name": text_field("Name", primary=True)}, rows=[{"id": 1, "Name": "a"}])
+    client.failures.append(("PATCH", http_error(400, {"error": "ERROR_FIELD_DOES_NOT_EXIST"})))
+
+    with pytest.raises(Exception):
+        updater.update_rows([{"Name": "a"}])
+    assert updater.schema_loaded_at == float("-inf")
+
+def test_normalize_options(schema):
+    data = {"Name": "a", "A": True, "B": 0, "Z": 1, "X": True, "Y": False}
+    assert normalize(schema, data) == {"Name": "a", "Single": "A", "Multiple": ["X", "Z"]}
+    # the caller's record is left untouched
+    assert data == {"Name": "a", "A": True, "B": 0, "Z": 1, "X": True, "Y": False}
+
+def test_normalize_explicit_option_value_wins(schema):
+    assert normalize(schema, {"Name": "a", "Single": "B", "A": True}) == {"Name": "a", "Single": "B"}
+
+def test_normalize_multiple_options_for_single_select(schema):
+    with pytest.raises(ValueError, match="Multiple options for single select"):
+        normalize(schema, {"Name": "a", "A": True, "B": True})
+
+def test_status_code_from_error_chain():
+    try:
+        try:
+            raise http_error(503)
+        except requests.HTTPError as e:
+            raise Exception(f"Failed to add rows: {e}")
+    except Exception as e:
+        error = e
+    assert update_baserow._status_code(error) == 503
+    assert update_baserow._status_code(Exception("429 Client Error: Too Many Requests")) == 429
+    assert update_baserow._status_code(Exception("something else")) is None
+
+def test_update_rows_partial_batch_failure_does_not_resend_saved_chunks():
+    updater, client = make_updater({"Name": text_field("Name", primary=True)}, batch_size=2)
+
+    original = client.make_api_request
+    def fail_second_post(endpoint, method="GET", data=None, **kwargs):
+        if method == "POST" and len(client.calls("POST")) == 1:
+            client.requests.append((method, endpoint, data))
+            raise http_error(503)
+        return original(endpoint, method, data, **kwargs)
+    client.make_api_request = fail_second_post
+
+    with pytest.raises(Exception):
+        updater.update_rows([{"Name": str(i)} for i in range(4)])
+    # the first chunk was saved and is not sent again, a 503 on a POST is not resent at all
+    assert len(client.calls("POST")) == 2
+    assert sorted(x["Name"] for x in client.rows.values()) == ["0", "1"]
+
+def test_update_rows_resends_rate_limited_chunk():
+    updater, client = make_updater({"Name": text_field("Name", primary=True)}, batch_size=2)
+    client.failures.append(("POST", http_error(429)))
+
+    assert updater.update_rows([{"Name": str(i)} for i in range(4)]) == [1, 2, 3, 4]
+    assert len(client.calls("POST")) == 3
+
+@pytest.mark.parametrize("retry_max_count", [0, 2])
+def test_lookups_follow_retry_settings(retry_max_count):
+    statuses = list()
+
+    class Unavailable(BaseHTTPRequestHandler):
+        def do_GET(self):
+            statuses.append(503)
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Unavailable)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        updater = BaserowUpdater(url, "token", 1, schema={"Name": text_field("Name", primary=True)}, retry_max_count=retry_max_count, retry_wait_seconds=0)
+        with pytest.raises(Exception):
+            updater.find_rows([Filter("Name", "a")])
+    finally:
+        server.shutdown()
+    assert len(statuses) == retry_max_count + 1
+
+def test_retry_waits_grow_linearly():
+    retry = update_baserow.http_session(3, 10).get_adapter("https://baserow.test").max_retries
+    waits = list()
+    for _ in range(3):
+        retry = retry.increment("GET", "/", error=ConnectionError())
+        waits.append(retry.get_backoff_time())
+    assert waits == [10, 20, 30]
+
+def test_normalize_dates(schema):
+    value = datetime(2024, 3, 4, 15, 30, 45)
+    data = {"Name": "a", "Date ISO": value, "Date US": value, "Date EU": value}
+    assert normalize(schema, data) == {"Name": "a", "Date ISO": "2024-03-04", "Date US": "03/04/2024 03:30:45 PM", "Date EU": "2024-03-04"}
+
+def test_normalize_invalid_date(schema):
+    with pytest.raises(ValueError, match="Invalid date value for column: Date ISO"):
+        normalize(schema, {"Name": "a", "Date ISO": "2024-03-04"})
+
+def test_lookup_key_compares_numbers_numerically():
+    fields = [number_field("Id"), text_field("Name")]
+    assert lookup_key(fields, [5, "a"]) == lookup_key(fields, ["5", "a"])
+    assert lookup_key(fields, ["5.50", "a"]) == lookup_key(fields, [5.5, "a"])
+
+def test_lookup_chunks_limits():
+    keys = [(str(i),) for i in range(1000)]
+    chunks = list(lookup_chunks("Name", keys))
+    assert [x for chunk in chunks for x in chunk] == keys
+    assert all(len(x) <= LOOKUP_PAGE_SIZE for x in chunks)
+
+    long_keys = [("x" * 500 + str(i),) for i in range(20)]
+    for chunk in lookup_chunks("Name", long_keys):
+        filter_tree = {"filter_type": "OR", "filters": [{"field": "Name", "type": "equal", "value": x[0]} for x in chunk], "groups": []}
+        assert len(chunk) == 1 or len(urllib.parse.quote(json.dumps(filter_tree))) <= LOOKUP_FILTER_MAX_LENGTH
+
+def test_update_rows_numeric_primary():
+    fields = {"Id": number_field("Id", primary=True), "Name": text_field("Name")}
+    updater, client = make_updater(fields, rows=[{"id": 7, "Id": "1", "Name": "old"}])
+
+    assert updater.update_rows([{"Id": 1, "Name": "new"}, {"Id": 2, "Name": "added"}]) == [7, 8]
+    assert client.rows[7]["Name"] == "new"
+    assert len(client.calls("GET")) == 1
+
+def test_update_rows_composite_primary():
+    fields = {"A": text_field("A", primary=True), "B": number_field("B", primary=True), "Name": text_field("Name")}
+    updater, client = make_updater(fields, rows=[{"id": 3, "A": "x", "B": "1", "Name": "old"}])
+
+    assert updater.update_rows([{"A": "x", "B": 1, "Name": "new"}, {"A": "x", "B": 2, "Name": "added"}]) == [3, 4]
+    assert client.rows[3]["Name"] == "new"
+
+def test_update_row_uses_row_id_cache():
+    updater, client = make_updater({"Name": text_field("Name", primary=True), "Number": number_field("Number")})
+
+    row_id = updater.update_row({"Name": "a", "Number": 1})
+    assert updater.update_row({"Name": "a", "Number": 2}) == row_id
+    assert updater.update_rows([{"Name": "a", "Number": 3}]) == [row_id]
+    assert len(client.calls("GET")) == 1
+    assert client.rows[row_id]["Number"] == 3
+
+def test_deleted_cached_row_is_looked_up_again():
+    updater, client = make_updater({"Name": text_field("Name", primary=True)})
+
+    row_id = updater.update_row({"Name": "a"})
+    del client.rows[row_id]
+    new_row_id = updater.update_row({"Name": "a"})
+    assert new_row_id != row_id
+
+    del client.rows[new_row_id]
+    assert updater.update_rows([{"Name": "a"}]) == [new_row_id + 1]
+
+def test_normalize_unknown_columns(schema):
+    with pytest.raises(ValueError, match=r"Columns not found in schema: \['Nope', 'Other'\]"):
+        normalize(schema, {"Name": "a", "A": True, "Other": 1, "Nope": 1})
+
+def test_bulk_sync_collects_results_per_table(monkeypatch):
+    fields = {"Name": text_field("Name", primary=True)}
+    clients = {table_id: FakeClient() for table_id in (1, 2, 3)}
+
+    def updater_for(baserow_url, baserow_api_key, table_id, **kwargs):
+        return BaserowUpdater(baserow_url, baserow_api_key, make_table(clients[table_id], fields, table_id), schema=fields, **kwargs)
+    monkeypatch.setattr(update_baserow, "BaserowUpdater", updater_for)
+
+    results = update_baserow.bulk_sync("http://baserow.test", "token", {
+        1: [{"Name": "a"}, {"Name": "b"}],
+        2: [{"Name": "a"}, {"Name": "a"}],
+        3: [{"Name": "c"}],
+    }, max_workers=2, retry_wait_seconds=0)
+
+    assert results[1] == [1, 2]
+    assert isinstance(results[2], ValueError)
+    # the failing table doesn't stop the others
+    assert results[3] == [1]
+    assert len(clients[3].rows) == 1
+
+def test_row_plan_is_shared_by_rows_with_the_same_columns(schema):
+    keys = frozenset({"Name", "A"})
+    assert schema.row_plan(keys) is schema.row_plan(keys)
+
+def test_normalize_missing_primary(schema):
+    with pytest.raises(ValueError, match="Primary column is missing"):
+        normalize(schema, {"Number": 1})
+
+def test_normalize_names_are_literals():
+    # column and option names end up in generated code, they must never be executed
+    name = "x'); raise SystemExit('"
+    fields = [text_field("Name", primary=True), date_field(name, "ISO"), select_field(name + "s", [name + "o"])]
+    table_schema = TableSchema.from_fields({x.name: x for x in fields})
+    data = {"Name": "a", name: datetime(2024, 1, 2), name + "o": True}
+    assert normalize(table_schema, data) == {"Name": "a", name: "2024-01-02", name + "s": name + "o"}
+
+def test_row_plans_evict_least_recently_used(schema, monkeypatch):
+    monkeypatch.setattr(update_baserow, "ROW_PLAN_CACHE_SIZE", 2)
+    table_schema = TableSchema.from_fields(schema.fields)
+    first, second, third = frozenset({"Name", "A"}), frozenset({"Name", "B"}), frozenset({"Name", "X"})
+
+    first_plan = table_schema.row_plan(first)
+    table_schema.row_plan(second)
+    table_schema.row_plan(first)
+    table_schema.row_plan(third)
+    # past the limit new key sets are still cached, replacing the one used longest ago
+    assert table_schema.row_plan(first) is first_plan
+    assert table_schema.row_plan(third) is table_schema.row_plan(third)
+    assert second not in table_schema.row_plans
+
+def test_schema_passed_per_call_is_built_once():
+    fields = {"Name": text_field("Name", primary=True)}
+    updater, _ = make_updater(fields)
+    other = {"Name": text_field("Name", primary=True), "Number": number_field("Number")}
+
+    assert updater._resolve_schema(fields) is updater.table_schema
+    assert updater._resolve_schema(other) is updater._resolve_schema(other)
+    # changing the dict in place gives it a new schema
+    other["Extra"] = text_field("Extra")
+    assert "Extra" in updater._resolve_schema(other).schema_keys
@@ -1,16 +1,299 @@
-from copy import deepcopy
+import json
+import logging
 import os
-from time import sleep
-from baserowapi import Baserow, Filter, GenericField, Table
+import re
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from threading import Lock
+from time import monotonic, sleep
+from cachetools import LRUCache, TTLCache
+from baserowapi import Baserow, Filter, GenericField, Row, Table
 from baserowapi import MultipleSelectField, SingleSelectField, DateField
-from typing import Any, Dict, List, Union
-from urllib3.exceptions import HTTPError
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple, Union
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+def _make_date_formatter(date_include_time: bool, date_format: str) -> Callable[[datetime], str]:
+    if date_include_time:
+        if date_format == 'ISO':
+            return datetime.isoformat
+        elif date_format == 'US':
+            return lambda d: d.strftime('%m/%d/%Y %I:%M:%S %p')
+        else:
+            # likely to fail if the date format is not supported
+            return lambda d: d.strftime(date_format)
+    else:
+        if date_format == 'ISO':
+            return lambda d: d.date().isoformat()
+        elif date_format == 'US':
+            return lambda d: d.date().strftime('%m/%d/%Y')
+        else:
+            # likely to fail if the date format is not supported
+            return lambda d: str(d.date())
+
+def _lookup_value(col: GenericField, value: Any) -> Any:
+    # Baserow returns numbers as strings ("123", "123.50"), compare them numerically instead
+    if col.TYPE == "number" and value is not None:
+        try:
+            return Decimal(str(value))
+        except InvalidOperation:
+            pass
+    return str(value)
+
+def lookup_key(primary_cols: List[GenericField], values: List[Any]) -> tuple:
+    return tuple(_lookup_value(col, value) for col, value in zip(primary_cols, values))
+
+_SELECT_TYPES = frozenset({"single_select", "multiple_select"})
+
+# plans are memoized per key set on the schema, one key per select option means sparse rows
+# can produce hundreds of key sets, least recently used plans are dropped past this
+ROW_PLAN_CACHE_SIZE = 1024
+
+def _compile_normalizer(option_keys: List[Tuple[str, str]], option_types: Dict[str, str], date_formatters: List[Tuple[str, Callable[[datetime], str]]]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    # straight line code for one key set, names and messages only ever go in as repr() literals
+    namespace: Dict[str, Any] = {"datetime": datetime}
+    lines = [
+        "def normalize(d):",
+        # shallow copy: only top level keys are added, popped or replaced, nested values are shared with d
+        "    r = dict(d)",
+    ]
+
+    option_vars = {col_name: f"o{i}" for i, col_name in enumerate(option_types)}
+    for var in option_vars.values():
+        lines.append(f"    {var} = []")
+    for key, col_name in option_keys:
+        lines.append(f"    v = r.pop({key!r})")
+        # same matches as `in [1, True]` without building a list, and safe for unhashable values
+        lines.append(f"    if v is True or v == 1: {option_vars[col_name]}.append({key!r})")
+    for col_name, var in option_vars.items():
+        if option_types[col_name] == "single_select":
+            lines.append(f"    if len({var}) > 1: raise ValueError(f'Multiple options for single select: {{{var}}}')")
+            lines.append(f"    if {var} and r.get({col_name!r}) is None: r[{col_name!r}] = {var}[0]")
+        else:
+            lines.append(f"    if {var} and r.get({col_name!r}) is None: r[{col_name!r}] = {var}")
+
+    for i, (col_name, formatter) in enumerate(date_formatters):
+        namespace[f"f{i}"] = formatter
+        lines.append(f"    v = r[{col_name!r}]")
+        lines.append("    if v is not None:")
+        lines.append(f"        if not isinstance(v, datetime): raise ValueError({'Invalid date value for column: ' + col_name!r})")
+        lines.append(f"        r[{col_name!r}] = f{i}(v)")
+
+    lines.append("    return r")
+    exec("\n".join(lines), namespace)
+    return namespace["normalize"]
+
+@dataclass
+class RowPlan:
+    # what normalizing a row with a given set of keys involves, worked out once per key set
+    option_keys: List[Tuple[str, str]]
+    option_types: Dict[str, str]
+    date_formatters: List[Tuple[str, Callable[[datetime], str]]]
+    normalize: Callable[[Dict[str, Any]], Dict[str, Any]]
+
+@dataclass
+class TableSchema:
+    fields: Dict[str, GenericField]
+    primary_cols: List[GenericField]
+    option_cols: List[Union[MultipleSelectField, SingleSelectField]]
+    date_cols: List[DateField]
+    schema_keys: FrozenSet[str]
+    option_index: Dict[str, Tuple[str, str]]
+    date_formatters: Dict[str, Callable[[datetime], str]]
+    row_plans: LRUCache = field(default_factory=lambda: LRUCache(maxsize=ROW_PLAN_CACHE_SIZE))
+    # schemas are shared between updaters and threads, LRUCache reorders itself even on reads
+    row_plans_lock: Lock = field(default_factory=Lock, repr=False, compare=False)
+
+    @classmethod
+    def from_fields(cls, fields: Dict[str, GenericField]) -> "TableSchema":
+        primary_cols, option_cols, date_cols = [], [], []
+        for col in fields.values():
+            if col.is_primary:
+                primary_cols.append(col)
+            col_type = col.TYPE
+            if col_type in _SELECT_TYPES:
+                option_cols.append(col)
+            elif col_type == "date":
+                date_cols.append(col)
+
+        # col.options is rebuilt from the field data on every access
+        option_names = {col.name: col.options for col in option_cols}
+
+        # option name -> (owning column name, column type), the first column listing an option owns it
+        option_index: Dict[str, Tuple[str, str]] = dict()
+        for col in option_cols:
+            for option in option_names[col.name]:
+                option_index.setdefault(option, (col.name, col.TYPE))
+
+        return cls(
+            fields=fields,
+            primary_cols=primary_cols,
+            option_cols=option_cols,
+            date_cols=date_cols,
+            schema_keys=frozenset(fields),
+            option_index=option_index,
+            date_formatters={col.name: _make_date_formatter(col.date_include_time, col.date_format) for col in date_cols},
+        )
+
+    def row_plan(self, keys: FrozenSet[str]) -> RowPlan:
+        with self.row_plans_lock:
+            row_plan = self.row_plans.get(keys)
+        if row_plan is None:
+            row_plan = self.__build_row_plan(keys)
+            with self.row_plans_lock:
+                self.row_plans[keys] = row_plan
+        return row_plan
+
+    def __build_row_plan(self, keys: FrozenSet[str]) -> RowPlan:
+        for col in self.primary_cols:
+            if col.is_read_only:
+                raise ValueError("Primary column is read only")
+            if col.name not in keys:
+                raise ValueError("Primary column is missing")
 
-class BaserowUpdater:
-    def __init__(self, baserow_url: str, baserow_api_key: str, table: Union[int, Table], schema: Dict[str, Any] = None, retry_max_count: int = 3, retry_wait_seconds: int = 10):
+        option_keys: List[Tuple[str, str]] = list()
+        option_types: Dict[str, str] = dict()
+        # walk the index rather than the keys so option values keep the column's option order
+        for key, meta in self.option_index.items():
+            if key in keys:
+                option_keys.append((key, meta[0]))
+                option_types[meta[0]] = meta[1]
+
+        remaining_keys = keys.difference(x[0] for x in option_keys)
+        unknown_columns = remaining_keys - self.schema_keys
+        if unknown_columns:
+            raise ValueError(f"Columns not found in schema: {sorted(unknown_columns)}")
+
+        date_formatters = [(name, formatter) for name, formatter in self.date_formatters.items() if name in remaining_keys]
+
+        return RowPlan(
+            option_keys=option_keys,
+            option_types=option_types,
+            date_formatters=date_formatters,
+            normalize=_compile_normalizer(option_keys, option_types, date_formatters),
+        )
+
+# schemas rarely change, so share them between updaters keyed on (baserow_url, table_id)
+_SCHEMA_CACHE: Dict[Tuple[str, int], Tuple[float, TableSchema]] = dict()
+_SCHEMA_CACHE_LOCK = Lock()
+
+def invalidate_schema(table_id: int, baserow_url: Optional[str] = None) -> None:
+    with _SCHEMA_CACHE_LOCK:
+        for key in list(_SCHEMA_CACHE.keys()):
+            if key[1] == table_id and (baserow_url is None or key[0] == baserow_url.rstrip('/')):
+                del _SCHEMA_CACHE[key]
+
+# retried with backoff inside the shared session's pool for idempotent requests (GET, PATCH)
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+# a rate limited request was never processed, so even a POST can be sent again
+RESEND_STATUS_CODES = frozenset({429})
+
+# the largest page Baserow will return, so one OR filter chunk is answered by a single GET
+LOOKUP_PAGE_SIZE = 200
+# the OR filter travels as url encoded json in the query string, keep it well under the
+# 4-8 KB request line limits of gunicorn / nginx in front of Baserow
+LOOKUP_FILTER_MAX_LENGTH = 3000
+
+def lookup_chunks(col_name: str, keys: List[tuple]) -> Iterator[List[tuple]]:
+    chunk: List[tuple] = list()
+    chunk_length = 0
+    for key in keys:
+        # encoded size of this key's entry in the filter tree, as baserowapi builds it
+        length = len(urllib.parse.quote(json.dumps({"field": col_name, "type": "equal", "value": str(key[0])}))) + 6
+        if chunk and (len(chunk) == LOOKUP_PAGE_SIZE or chunk_length + length > LOOKUP_FILTER_MAX_LENGTH):
+            yield chunk
+            chunk, chunk_length = list(), 0
+        chunk.append(key)
+        chunk_length += length
+    if chunk:
+        yield chunk
+
+HTTP_POOL_CONNECTIONS = 16
+HTTP_POOL_MAXSIZE = 64
+
+class LinearRetry(Retry):
+    # wait backoff_factor seconds, then twice that and so on, the schedule the updaters' own retry loops use
+    def get_backoff_time(self) -> float:
+        return float(min(self.backoff_max, len(self.history) * self.backoff_factor))
+
+# one pooled session per retry policy, in practice every updater in a process shares the same one
+_HTTP_SESSIONS: Dict[Tuple[int, float], Session] = dict()
+_HTTP_SESSION_LOCK = Lock()
+
+def http_session(retry_max_count: int = 3, retry_wait_seconds: float = 10) -> Session:
+    # shared by every Baserow client so connections (and their TLS handshakes) are reused,
+    # auth headers are sent per request by baserowapi so the session itself carries none
+    with _HTTP_SESSION_LOCK:
+        session = _HTTP_SESSIONS.get((retry_max_count, retry_wait_seconds))
+        if session is None:
+            retry = LinearRetry(
+                total=retry_max_count,
+                backoff_factor=retry_wait_seconds,
+                status_forcelist=sorted(RETRYABLE_STATUS_CODES),
+                allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"PATCH"},
+                # hand the final response back so baserowapi can report the status itself
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+            session = Session()
+            session.headers["Connection"] = "keep-alive"
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _HTTP_SESSIONS[(retry_max_count, retry_wait_seconds)] = session
+        return session
+
+def _http_response(e: Exception) -> Optional[Any]:
+    # baserowapi raises new exceptions inside its except blocks, the requests error with the response is in the chain
+    while e is not None:
+        response = getattr(e, "response", None)
+        if response is not None:
+            return response
+        e = e.__cause__ or e.__context__
+    return None
+
+def _status_code(e: Exception) -> Optional[int]:
+    response = _http_response(e)
+    if response is not None:
+        return response.status_code
+    # otherwise the status is only left in the message
+    status_code = getattr(e, "status_code", None)
+    if status_code is None:
+        match = re.search(r"\b(\d{3}) (?:Client|Server) Error", str(e))
+        status_code = int(match.group(1)) if match else None
+    return status_code
+
+def _can_resend(e: Exception) -> bool:
+    return _status_code(e) in RESEND_STATUS_CODES
+
+# Baserow error codes for a payload that no longer matches the table's fields
+SCHEMA_DRIFT_ERROR_CODES = frozenset({"ERROR_FIELD_DOES_NOT_EXIST", "ERROR_REQUEST_BODY_VALIDATION"})
+
+def _is_schema_drift(e: Exception) -> bool:
+    # only a server rejection counts, baserowapi's local writable field checks carry no response
+    response = _http_response(e)
+    if response is None or response.status_code != 400:
+        return False
+    try:
+        error_code = response.json().get("error")
+    except ValueError:
+        return False
+    return error_code in SCHEMA_DRIFT_ERROR_CODES
+
+class BaserowTableBase:
+    # table handle, cached schema and row normalization, shared by the sync and async updaters
+    def __init__(self, baserow_url: str, baserow_api_key: str, table: Union[int, Table], schema: Dict[str, Any] = None, retry_max_count: int = 3, retry_wait_seconds: int = 10, schema_ttl_seconds: int = 300):
         self.baserow_url = baserow_url.rstrip('/')
         self.retry_max_count = retry_max_count
         self.retry_wait_seconds = retry_wait_seconds
+        self.schema_ttl_seconds = schema_ttl_seconds
+        # schemas passed per call to update_row / update_rows, built once rather than on every call
+        self._schema_overrides: LRUCache = LRUCache(maxsize=16)
 
         self.baserow = self._baserow_api(baserow_api_key)
 
@@ -24,9 +307,11 @@ class BaserowUpdater:
             raise ValueError("Table must be int or Table")
 
         self.schema = schema
+        self.schema_supplied = schema is not None
         if schema is None:
             self.__get_table_schema()
-
+        else:
+            self.table_schema = TableSchema.from_fields(schema)
 
     def _baserow_api(self, baserow_api_key: str) -> Baserow:
         if not self.baserow_url:
@@ -35,139 +320,272 @@ class BaserowUpdater:
         if not baserow_api_key:
             raise ValueError("BASEROW_API_KEY is None")
 
-        return Baserow(url=self.baserow_url, token=baserow_api_key)
+        baserow = Baserow(url=self.baserow_url, token=baserow_api_key)
+        # GET and PATCH are retried inside the pool, so it is built with this updater's retry settings
+        self.http_session = http_session(self.retry_max_count, self.retry_wait_seconds)
+        baserow.session = self.http_session
+        return baserow
 
     def __get_table(self) -> None:
         self.table = self.baserow.get_table(self.table_id)
 
     def __get_table_schema(self) -> None:
-        table_fields = self.table.field_names
-        self.schema = {col: self.table.fields[col] for col in table_fields}
+        cache_key = (self.baserow_url, self.table_id)
+        with _SCHEMA_CACHE_LOCK:
+            cached = _SCHEMA_CACHE.get(cache_key)
 
-    def __upsert_row_to_table(self, update_data: Dict[str, Any], row_id: int, retry_count: int = 0) -> int:
-        try:
-            if row_id == -1:
-                added_row = self.table.add_rows(update_data)
-                return added_row[0].id
-            else:
-                update_data["id"] = row_id
-                self.table.update_rows([update_data])
-                return row_id
-        except HTTPError as e:
-            print("update_or_add_row - HTTPError", e)
-            if retry_count < self.retry_max_count:
-                sleep((retry_count + 1) * self.retry_wait_seconds)
-                return self.__upsert_row_to_table(update_data, row_id, retry_count + 1)
-            raise e
-        except Exception as e:
-            raise e
+        if cached is not None and monotonic() - cached[0] < self.schema_ttl_seconds:
+            loaded_at, table_schema = cached
+        else:
+            if cached is not None:
+                # expired, the Table object still holds the old fields
+                self.__get_table()
+            table_fields = self.table.field_names
+            table_schema = TableSchema.from_fields({col: self.table.fields[col] for col in table_fields})
+            loaded_at = monotonic()
+            with _SCHEMA_CACHE_LOCK:
+                _SCHEMA_CACHE[cache_key] = (loaded_at, table_schema)
+
+        self.table_schema = table_schema
+        self.schema = table_schema.fields
+        self.schema_loaded_at = loaded_at
+
+    def invalidate_schema(self) -> None:
+        invalidate_schema(self.table_id, self.baserow_url)
+        # the Table object caches its fields, so a fresh one is needed to see the new schema
+        self.__get_table()
+        # reloaded on next use rather than here, this runs while handling the error that prompted it
+        self.schema_loaded_at = float("-inf")
+
+    def _resolve_schema(self, schema: Dict[str, GenericField] = None) -> TableSchema:
+        if schema is not None and schema is not self.schema:
+            # keyed on the field objects rather than the dict, so a dict changed in place is built again,
+            # the cached copy keeps those fields alive so their ids can't be reused
+            cache_key = tuple((name, id(col)) for name, col in schema.items())
+            table_schema = self._schema_overrides.get(cache_key)
+            if table_schema is None:
+                table_schema = self._schema_overrides[cache_key] = TableSchema.from_fields(dict(schema))
+            return table_schema
+
+        if not self.schema_supplied and monotonic() - self.schema_loaded_at >= self.schema_ttl_seconds:
+            self.__get_table_schema()
 
-    def find_rows(self, filters: List[Filter], filter_type='AND', retry_count=0):
-        try:
-            matching_rows = self.table.get_rows(filters=filters, filter_type=filter_type)
-        except HTTPError as e:
-            print("find_rows - HTTPError", e)
-            if retry_count < self.retry_max_count:
-                sleep((retry_count + 1) * self.retry_wait_seconds)
-                return self.find_rows(filters, filter_type, retry_count + 1)
-            raise e
-        except Exception as e:
-            raise e
+        return self.table_schema
 
-        return matching_rows
-    
-    def update_row(self, data: Dict[str, Any], schema: Dict[Dict, GenericField] = None) -> int:
-        schema = self.schema if schema is None else schema
-        primary_cols = [x for x in schema.values() if x.is_primary]
-        if len(primary_cols) == 0:
+    def _primary_cols(self, table_schema: TableSchema) -> List[GenericField]:
+        if len(table_schema.primary_cols) == 0:
             raise ValueError("No primary column found")
-
+        return table_schema.primary_cols
+
+    def _prepare_rows(self, records: List[Dict[str, Any]], table_schema: TableSchema) -> List[Dict[str, Any]]:
+        # rows sharing the same columns share a plan, so the schema is only consulted once per distinct key set
+        row_plans: Dict[FrozenSet[str], RowPlan] = dict()
+        prepared = list()
+        for data in records:
+            keys = frozenset(data)
+            row_plan = row_plans.get(keys)
+            if row_plan is None:
+                row_plan = row_plans[keys] = table_schema.row_plan(keys)
+            prepared.append(row_plan.normalize(data))
+        return prepared
+
+    def _prepare_row(self, data: Dict[str, Any], table_schema: TableSchema) -> Dict[str, Any]:
+        return table_schema.row_plan(frozenset(data)).normalize(data)
+
+class BaserowUpdater(BaserowTableBase):
+    def __init__(self, baserow_url: str, baserow_api_key: str, table: Union[int, Table], schema: Dict[str, Any] = None, retry_max_count: int = 3, retry_wait_seconds: int = 10, batch_size: int = 100, schema_ttl_seconds: int = 300, row_id_cache_size: int = 10_000, row_id_cache_ttl_seconds: int = 60):
+        self.batch_size = batch_size
+        # (table_id, primary key) -> row id, saves the lookup when the same rows are synced again
+        self._pk_cache: TTLCache = TTLCache(maxsize=row_id_cache_size, ttl=row_id_cache_ttl_seconds)
+
+        super().__init__(baserow_url, baserow_api_key, table, schema, retry_max_count, retry_wait_seconds, schema_ttl_seconds)
+
+    def __upsert_row_to_table(self, update_data: Dict[str, Any], row_id: int) -> int:
+        if row_id == -1:
+            return self.__upsert_chunk_to_table([update_data], add=True)[0]
+        update_data["id"] = row_id
+        return self.__upsert_chunk_to_table([update_data], add=False)[0]
+
+    def find_rows(self, filters: List[Filter], filter_type='AND', include: List[str] = None, size: int = None, limit: Optional[int] = None):
+        # transient statuses are already retried with backoff by the shared session
+        return self.table.get_rows(filters=filters, filter_type=filter_type, include=include, size=size, limit=limit)
+
+    def iter_rows(self, filters: List[Filter], filter_type='AND', page_size: int = LOOKUP_PAGE_SIZE) -> Iterator[Row]:
+        # pages are only requested as the caller consumes rows, so next(rows, None) costs a single page
+        yield from self.table.get_rows(filters=filters, filter_type=filter_type, size=page_size, iterator=True)
+
+    def __find_row_id(self, data: Dict[str, Any], primary_cols: List[GenericField]) -> int:
         filters = [Filter(x.name, data[x.name]) for x in primary_cols]
-        matching_rows = self.find_rows(filters)
+        # one match is an update and two is already an error, so there is no need to fetch more
+        matching_rows = self.find_rows(filters, size=2, limit=2)
 
         row_id = -1
         if len(matching_rows) == 1:
             row_id = matching_rows[0].id
         elif len(matching_rows) > 1:
             raise ValueError("Multiple rows found")
+        return row_id
 
-        for col in primary_cols:
-            if col.is_read_only:
-                raise ValueError("Primary column is read only")
-            if col.name not in data:
-                raise ValueError("Primary column is missing")
-
-        update_data = deepcopy(data)
+    def update_row(self, data: Dict[str, Any], schema: Dict[Dict, GenericField] = None) -> int:
+        table_schema = self._resolve_schema(schema)
+        primary_cols = self._primary_cols(table_schema)
 
-        option_cols: List[Union[MultipleSelectField, SingleSelectField]] = [x for x in schema.values() if x.TYPE in ["single_select", "multiple_select"]]
-        option_values: Dict[str, List] = dict()
+        cache_key = (self.table_id, lookup_key(primary_cols, [data[x.name] for x in primary_cols]))
+        row_id = self._pk_cache.get(cache_key)
+        from_cache = row_id is not None
+        if not from_cache:
+            row_id = self.__find_row_id(data, primary_cols)
 
-        for col in option_cols:
-            col_name = col.name
-            option_values[col_name] = list()
-            for option in col.options:
-                if option in update_data:
-                    if update_data[option] in [1, True]:
-                        option_values[col_name].append(option)
-                    update_data.pop(option, None)
-
-            if col.TYPE == "single_select":
-                if len(option_values[col_name]) > 1:
-                    raise ValueError(f"Multiple options for single select: {option_values[col_name]}")
-
-        for col in option_cols:
-            col_option_values = option_values[col.name]
+        update_data = self._prepare_row(data, table_schema)
 
-            if len(col_option_values) == 0:
-                continue
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("upsert payload: %s", update_data)
+        try:
+            row_id = self.__upsert_row_to_table(update_data, row_id)
+        except Exception as e:
+            self._pk_cache.pop(cache_key, None)
+            if not from_cache or _status_code(e) != 404:
+                raise e
+            # the cached row has been deleted since, look it up again
+            update_data.pop("id", None)
+            row_id = self.__upsert_row_to_table(update_data, self.__find_row_id(data, primary_cols))
+
+        self._pk_cache[cache_key] = row_id
+        return row_id
 
-            if update_data.get(col.name) is not None:
-                continue
-            col_name = col.name
-            if col.TYPE == "single_select":
-                update_data[col_name] = col_option_values[0]
-            else:
-                update_data[col_name] = col_option_values
-
-        date_cols: List[DateField] = [x for x in schema.values() if x.TYPE == "date"]
-        for col in date_cols:
-            if col.name not in update_data:
-                continue
-
-            if not isinstance(update_data[col.name], datetime):
-                raise ValueError(f"Invalid date value for column: {col.name}")
-            
-            datetime_value: datetime = update_data[col.name]
-
-            if col.date_include_time:
-                if col.date_format == 'ISO':
-                    update_data[col.name] = datetime_value.isoformat()
-                elif col.date_format == 'US':
-                    update_data[col.name] = datetime_value.strftime('%m/%d/%Y %I:%M:%S %p')
+    def __find_row_ids(self, keys: List[tuple], primary_cols: List[GenericField]) -> Dict[tuple, int]:
+        row_ids: Dict[tuple, int] = dict()
+
+        if len(primary_cols) == 1:
+            # a single OR filter per chunk finds every existing row in one request,
+            # only the primary column is fetched as that is all the match needs
+            col = primary_cols[0]
+            for chunk in lookup_chunks(col.name, keys):
+                filters = [Filter(col.name, str(key[0])) for key in chunk]
+                for row in self.find_rows(filters, filter_type='OR', include=[col.name], size=LOOKUP_PAGE_SIZE):
+                    key = lookup_key(primary_cols, [row[col.name]])
+                    if key in row_ids:
+                        raise ValueError(f"Multiple rows found: {key}")
+                    row_ids[key] = row.id
+            return row_ids
+
+        # composite primary keys can't be expressed as a flat OR filter
+        for key in keys:
+            filters = [Filter(col.name, str(value)) for col, value in zip(primary_cols, key)]
+            matching_rows = self.find_rows(filters, size=2, limit=2)
+            if len(matching_rows) > 1:
+                raise ValueError(f"Multiple rows found: {key}")
+            if len(matching_rows) == 1:
+                row_ids[key] = matching_rows[0].id
+        return row_ids
+
+    def __upsert_chunk_to_table(self, chunk: List[Dict[str, Any]], add: bool) -> List[int]:
+        for attempt in range(self.retry_max_count + 1):
+            try:
+                if add:
+                    added_rows = self.table.add_rows(chunk, batch_size=len(chunk))
+                    return [x.id for x in added_rows]
                 else:
-                    # likely to fail if the date format is not supported
-                    update_data[col.name] = datetime_value.strftime(col.date_format)
+                    self.table.update_rows(chunk, batch_size=len(chunk))
+                    return [x["id"] for x in chunk]
+            except Exception as e:
+                # PATCH is retried inside the session's pool, POST isn't as it may have been applied,
+                # so only a rate limited add is left to resend here
+                if not add or attempt == self.retry_max_count or not _can_resend(e):
+                    if _is_schema_drift(e):
+                        self.invalidate_schema()
+                    raise e
+                logger.warning("update_or_add_rows - HTTPError %s", e)
+                sleep((attempt + 1) * self.retry_wait_seconds)
+
+    def __upsert_rows_to_table(self, rows: List[Dict[str, Any]], add: bool) -> List[int]:
+        # chunk here rather than in baserowapi so a retry only resends the chunk that failed,
+        # earlier chunks are already saved and would otherwise be added twice
+        row_ids: List[int] = list()
+        for i in range(0, len(rows), self.batch_size):
+            row_ids.extend(self.__upsert_chunk_to_table(rows[i:i + self.batch_size], add))
+        return row_ids
+
+    def update_rows(self, records: List[Dict[str, Any]], schema: Dict[Dict, GenericField] = None) -> List[int]:
+        table_schema = self._resolve_schema(schema)
+        primary_cols = self._primary_cols(table_schema)
+
+        prepared = self._prepare_rows(records, table_schema)
+        keys = [lookup_key(primary_cols, [data[x.name] for x in primary_cols]) for data in prepared]
+
+        unique_keys = list(dict.fromkeys(keys))
+        if len(unique_keys) != len(keys):
+            raise ValueError("Duplicate primary values in records")
+
+        row_ids: Dict[tuple, int] = dict()
+        cached_keys: List[tuple] = list()
+        for key in unique_keys:
+            row_id = self._pk_cache.get((self.table_id, key))
+            if row_id is not None:
+                row_ids[key] = row_id
+                cached_keys.append(key)
+
+        missing_keys = [x for x in unique_keys if x not in row_ids]
+        if missing_keys:
+            row_ids.update(self.__find_row_ids(missing_keys, primary_cols))
+
+        to_add: List[Dict[str, Any]] = list()
+        to_add_keys: List[tuple] = list()
+        to_update: List[Dict[str, Any]] = list()
+        for key, update_data in zip(keys, prepared):
+            if key in row_ids:
+                update_data["id"] = row_ids[key]
+                to_update.append(update_data)
             else:
-                if col.date_format == 'ISO':
-                    update_data[col.name] = datetime_value.date().isoformat()
-                elif col.date_format == 'US':
-                    update_data[col.name] = datetime_value.date().strftime('%m/%d/%Y')
-                else:
-                    # likely to fail if the date format is not supported
-                    update_data[col.name] = str(datetime_value.date())
-
-        for column_name in update_data.keys():
-            if column_name not in schema.keys():
-                raise ValueError(f"Column not found in schema: {column_name}")
-
-        print(update_data)
-        row_id = self.__upsert_row_to_table(update_data, row_id)
-
-        return row_id
+                to_add.append(update_data)
+                to_add_keys.append(key)
+
+        if to_add:
+            added_ids = self.__upsert_rows_to_table(to_add, add=True)
+            for key, row_id in zip(to_add_keys, added_ids):
+                row_ids[key] = row_id
+        if to_update:
+            try:
+                self.__upsert_rows_to_table(to_update, add=False)
+            except Exception as e:
+                for key in cached_keys:
+                    self._pk_cache.pop((self.table_id, key), None)
+                if not cached_keys or _status_code(e) != 404:
+                    raise e
+                # a cached row has been deleted since, start again with fresh lookups
+                return self.update_rows(records, schema)
+
+        for key in keys:
+            self._pk_cache[(self.table_id, key)] = row_ids[key]
+
+        return [row_ids[key] for key in keys]
+
+def bulk_sync(baserow_url: str, baserow_api_key: str, tables_to_records: Dict[int, List[Dict[str, Any]]], max_workers: int = 8, **updater_kwargs) -> Dict[int, Union[List[int], Exception]]:
+    # requests releases the GIL while waiting on the network, so one thread per table overlaps the round trips,
+    # more workers than pooled connections would just queue on the shared session
+    workers = min(len(tables_to_records), max_workers, HTTP_POOL_MAXSIZE)
+    if workers == 0:
+        return dict()
+
+    def sync_table(table_id: int, records: List[Dict[str, Any]]) -> List[int]:
+        updater = BaserowUpdater(baserow_url, baserow_api_key, table_id, **updater_kwargs)
+        return updater.update_rows(records)
+
+    results: Dict[int, Union[List[int], Exception]] = dict()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {table_id: executor.submit(sync_table, table_id, records) for table_id, records in tables_to_records.items()}
+        for table_id, future in futures.items():
+            # one failing table shouldn't lose the results of the others
+            try:
+                results[table_id] = future.result()
+            except Exception as e:
+                logger.warning("bulk_sync - table %s failed %s", table_id, e)
+                results[table_id] = e
+
+    return results
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
-    from datetime import datetime
     load_dotenv()
 
     table_id = 842